@@ -1,13 +1,50 @@
 import asyncio
 import aiohttp
-from dataclasses import dataclass
-from dataclasses_json import dataclass_json
-from typing import Optional, Union, List, Any
+import msgspec
+import base64
+import re
+import sys
+from collections import OrderedDict
+from typing import Optional, Union, List, Any, Dict, Generic, TypeVar, Hashable, Tuple
 import time
 
 
 STANDARD_SHARD = "-9223372036854775808"
 
+ENDPOINTS = (
+    "getAddressInformation",
+    "getExtendedAddressInformation",
+    "getWalletInformation",
+    "getTransactions",
+    "getAddressBalance",
+    "getAddressState",
+    "packAddress",
+    "unpackAddress",
+    "detectAddress",
+    "getMasterchainInfo",
+    "getConsensusBlock",
+    "lookupBlock",
+    "shards",
+    "getBlockTransactions",
+    "getBlockHeader",
+    "tryLocateTx",
+    "tryLocateSourceTx",
+    "runGetMethod",
+    "sendBoc",
+    "sendQuery",
+    "estimateFee",
+)
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# CPython fixed the leaked SSL transports in 3.12.8/3.13.1; aiohttp warns if the
+# workaround is still requested there.
+_NEEDS_CLEANUP_CLOSED = sys.version_info < (3, 12, 8) or (
+    (3, 13) <= sys.version_info < (3, 13, 1)
+)
+
+_json_encoder = msgspec.json.Encoder()
+
 
 class GenericException(Exception):
     pass
@@ -21,16 +58,12 @@ class LiteServerTimeout(GenericException):
     pass
 
 
-@dataclass_json
-@dataclass
-class TransactionID:
+class TransactionID(msgspec.Struct, gc=False):
     lt: Union[int, str]
     hash: str
 
 
-@dataclass_json
-@dataclass
-class BlockID:
+class BlockID(msgspec.Struct, frozen=True, gc=False):
     workchain: int
     shard: str
     seqno: int
@@ -38,15 +71,11 @@ class BlockID:
     file_hash: Optional[str] = None
 
 
-@dataclass_json
-@dataclass
-class Address:
+class Address(msgspec.Struct, gc=False):
     account_address: str
 
 
-@dataclass_json
-@dataclass
-class FullAccountState:
+class FullAccountState(msgspec.Struct, gc=False):
 
     balance: Union[int, str]
     last_transaction_id: TransactionID
@@ -58,26 +87,20 @@ class FullAccountState:
     address: Optional[Address] = None
 
 
-@dataclass_json
-@dataclass
-class WalletState:
+class WalletState(msgspec.Struct, gc=False):
     wallet: bool
     balance: Union[int, str]
     account_state: str
     last_transaction_id: TransactionID
 
 
-@dataclass_json
-@dataclass
-class MessageData:
+class MessageData(msgspec.Struct, gc=False):
     body: Optional[str] = None
     init_state: Optional[str] = None
     text: Optional[str] = None
 
 
-@dataclass_json
-@dataclass
-class Message:
+class Message(msgspec.Struct, gc=False):
     destination: str
     value: Union[str, int]
     fwd_fee: str
@@ -89,9 +112,7 @@ class Message:
     source: Optional[str] = None
 
 
-@dataclass_json
-@dataclass
-class Transaction:
+class Transaction(msgspec.Struct, gc=False):
 
     utime: int
     data: str
@@ -103,17 +124,13 @@ class Transaction:
     in_msg: Optional[Message] = None
 
 
-@dataclass_json
-@dataclass
-class Base64Address:
+class Base64Address(msgspec.Struct, frozen=True, gc=False):
 
     b64: str
     b64url: str
 
 
-@dataclass_json
-@dataclass
-class AddressMetadata:
+class AddressMetadata(msgspec.Struct, frozen=True, gc=False):
 
     raw_form: str
     bounceable: Base64Address
@@ -122,31 +139,23 @@ class AddressMetadata:
     test_only: bool
 
 
-@dataclass_json
-@dataclass
-class MasterchainState:
+class MasterchainState(msgspec.Struct, frozen=True, gc=False):
     last: BlockID
     state_root_hash: str
     init: BlockID
 
 
-@dataclass_json
-@dataclass
-class ConsensusBlock:
+class ConsensusBlock(msgspec.Struct, frozen=True, gc=False):
 
     consensus_block: int
     timestamp: float
 
 
-@dataclass_json
-@dataclass
-class Shards:
+class Shards(msgspec.Struct, gc=False):
     shards: List[BlockID]
 
 
-@dataclass_json
-@dataclass
-class ShortTransaction:
+class ShortTransaction(msgspec.Struct, gc=False):
 
     mode: int
     account: str
@@ -154,18 +163,14 @@ class ShortTransaction:
     hash: str
 
 
-@dataclass_json
-@dataclass
-class BlockTransactions:
+class BlockTransactions(msgspec.Struct, gc=False):
     id: BlockID
     req_count: int
     incomplete: bool
     transactions: List[ShortTransaction]
 
 
-@dataclass_json
-@dataclass
-class BlockHeader:
+class BlockHeader(msgspec.Struct, gc=False):
 
     id: BlockID
     global_id: int
@@ -185,14 +190,116 @@ class BlockHeader:
     prev_blocks: List[BlockID]
 
 
+T = TypeVar("T")
+
+
+class Envelope(msgspec.Struct, Generic[T]):
+    ok: bool
+    result: Optional[T] = None
+    error: str = ""
+    code: Optional[int] = None
+
+
+class LRUCache:
+    """
+    Mapping that keeps at most maxsize items, evicting the least recently used.
+    """
+
+    def __init__(self, maxsize: int = 50_000) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+BOUNCEABLE_TAG = 0x11
+NON_BOUNCEABLE_TAG = 0x51
+TEST_ONLY_FLAG = 0x80
+
+_RAW_ADDRESS = re.compile(r"(-?[0-9]+):([0-9a-fA-F]{64})")
+
+
+def _crc16(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
+    return crc & 0xFFFF
+
+
+def _pack_friendly(tag: int, workchain: int, account_id: bytes) -> Base64Address:
+    data = bytes((tag, workchain & 0xFF)) + account_id
+    data += _crc16(data).to_bytes(2, "big")
+    return Base64Address(
+        b64=base64.b64encode(data).decode(),
+        b64url=base64.urlsafe_b64encode(data).decode(),
+    )
+
+
+def _detect_address_local(address: str) -> AddressMetadata:
+    """
+    Compute all possible address forms locally, raising ValueError on unknown input.
+    """
+    if ":" in address:
+        match = _RAW_ADDRESS.fullmatch(address)
+        if match is None:
+            raise ValueError("Invalid raw address")
+        workchain = int(match.group(1))
+        account_id = bytes.fromhex(match.group(2))
+        if not -128 <= workchain <= 127:
+            raise ValueError("Invalid raw address")
+        given_type = "raw_form"
+        test_only = False
+    else:
+        if len(address) != 48:
+            raise ValueError("Invalid friendly address")
+        data = base64.b64decode(
+            address.replace("-", "+").replace("_", "/"), validate=True
+        )
+        if _crc16(data[:34]) != int.from_bytes(data[34:], "big"):
+            raise ValueError("Invalid address checksum")
+        tag = data[0] & ~TEST_ONLY_FLAG
+        if tag == BOUNCEABLE_TAG:
+            given_type = "friendly_bounceable"
+        elif tag == NON_BOUNCEABLE_TAG:
+            given_type = "friendly_non_bounceable"
+        else:
+            raise ValueError("Invalid address tag")
+        test_only = bool(data[0] & TEST_ONLY_FLAG)
+        workchain = int.from_bytes(data[1:2], "big", signed=True)
+        account_id = data[2:34]
+    flag = TEST_ONLY_FLAG if test_only else 0
+    return AddressMetadata(
+        raw_form=f"{workchain}:{account_id.hex()}",
+        bounceable=_pack_friendly(BOUNCEABLE_TAG | flag, workchain, account_id),
+        non_bounceable=_pack_friendly(NON_BOUNCEABLE_TAG | flag, workchain, account_id),
+        given_type=given_type,
+        test_only=test_only,
+    )
+
+
 class Client:
     def __init__(
         self,
         token: str = None,
         base_url: str = "https://toncenter.com/api/v2/",
         avoid_ratelimit: bool = True,
+        address_cache_size: int = 50_000,
+        memoize_ttl: float = 0.25,
     ) -> None:
         self.base_url: str = base_url
+        self._urls: Dict[str, str] = {name: base_url + name for name in ENDPOINTS}
         self.token: str = token
         self.client: aiohttp.ClientSession = None
         if token:
@@ -201,6 +308,14 @@ class Client:
             self.requests_limit = 1
         self.requests_count = 0
         self.avoid_ratelimit = avoid_ratelimit
+        self._decoders: Dict[Any, msgspec.json.Decoder] = {}
+        # Build the decoders used by the polling helpers up front.
+        for model in (List[Transaction], BlockTransactions, Shards, MasterchainState):
+            self._get_decoder(model)
+        self.address_cache = LRUCache(address_cache_size)
+        self.memoize_ttl = memoize_ttl
+        self._memoized: Dict[str, Tuple[float, Any]] = {}
+        self._memoize_locks: Dict[str, asyncio.Lock] = {}
 
     def check_ratelimit(self) -> bool:
         if self.requests_count >= self.requests_limit:
@@ -215,10 +330,18 @@ class Client:
             self.requests_count = 0
 
     async def start(self) -> None:
-        self.client: aiohttp.ClientSession = aiohttp.ClientSession()
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=64,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=_NEEDS_CLEANUP_CLOSED,
+        )
+        self.client: aiohttp.ClientSession = aiohttp.ClientSession(
+            connector=connector,
+            headers={"X-API-Key": self.token} if self.token else {},
+        )
         asyncio.create_task(self.reset_ratelimit())
-        if self.token:
-            self.client.headers.update({"X-API-Key": self.token})
 
     async def close(self) -> None:
         await self.client.close()
@@ -230,40 +353,82 @@ class Client:
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
         await self.close()
 
-    async def get(self, url: str, params: dict) -> dict:
+    def _get_decoder(self, model: Any) -> msgspec.json.Decoder:
+        decoder = self._decoders.get(model)
+        if decoder is None:
+            decoder = self._decoders[model] = msgspec.json.Decoder(Envelope[model])
+        return decoder
+
+    async def _process_response(
+        self, response: aiohttp.ClientResponse, model: Any
+    ) -> Any:
+        if response.status == 504:
+            raise LiteServerTimeout
+        try:
+            envelope = self._get_decoder(model).decode(await response.read())
+        except msgspec.DecodeError as e:
+            # Non-JSON proxy error pages, or a result not matching the model.
+            raise GenericException(f"HTTP {response.status}: {e}") from e
+        if response.status == 200 and envelope.ok:
+            return envelope.result
+        elif response.status == 422:
+            raise ValidationError(envelope.error)
+        else:
+            raise GenericException(envelope.error)
+
+    def _get_url(self, url: str) -> str:
+        return self._urls.get(url) or self.base_url + url
+
+    async def get(self, url: str, params: dict, model: Any = Any) -> Any:
         while not self.check_ratelimit() and self.avoid_ratelimit:
             await asyncio.sleep(0.1)
-        async with self.client.get(self.base_url + url, params=params) as response:
-            response_json = await response.json()
-            if response.status == 200 and response_json["ok"]:
-                return response_json["result"]
-            elif response.status == 422:
-                raise ValidationError(response_json["error"])
-            elif response.status == 504:
-                raise LiteServerTimeout
-            else:
-                raise GenericException(response_json["error"])
-
-    async def post(self, url: str, data: dict) -> dict:
+        async with self.client.get(self._get_url(url), params=params) as response:
+            return await self._process_response(response, model)
+
+    async def post(self, url: str, data: dict, model: Any = Any) -> Any:
         while not self.check_ratelimit() and self.avoid_ratelimit:
             await asyncio.sleep(0.1)
-        async with self.client.post(self.base_url + url, json=data) as response:
-            response_json = await response.json()
-            if response.status == 200 and response_json["ok"]:
-                return response_json["result"]
-            elif response.status == 422:
-                raise ValidationError(response_json["error"])
-            elif response.status == 504:
-                raise LiteServerTimeout
-            else:
-                raise GenericException(response_json["error"])
+        async with self.client.post(
+            self._get_url(url), data=_json_encoder.encode(data), headers=_JSON_HEADERS
+        ) as response:
+            return await self._process_response(response, model)
+
+    async def get_cached_address(self, url: str, address: str, model: Any) -> Any:
+        """
+        Address conversions never change, so their results are kept in an LRU cache.
+        """
+        key = (url, address)
+        result = self.address_cache.get(key)
+        if result is None:
+            result = await self.get(url, {"address": address}, model)
+            self.address_cache.set(key, result)
+        return result
+
+    async def get_memoized(self, url: str, model: Any) -> Any:
+        """
+        Share one request between callers asking for the same state within memoize_ttl.
+        Every caller gets the same instance, so the memoized models are frozen.
+        """
+        cached = self._memoized.get(url)
+        if cached and time.monotonic() - cached[0] < self.memoize_ttl:
+            return cached[1]
+        lock = self._memoize_locks.get(url)
+        if lock is None:
+            lock = self._memoize_locks[url] = asyncio.Lock()
+        async with lock:
+            cached = self._memoized.get(url)
+            if cached and time.monotonic() - cached[0] < self.memoize_ttl:
+                return cached[1]
+            result = await self.get(url, {}, model)
+            self._memoized[url] = (time.monotonic(), result)
+            return result
 
     async def get_address_info(self, address: str) -> FullAccountState:
         """
         Get basic information about the address: balance, code, data, last_transaction_id.
         """
-        return FullAccountState.from_dict(
-            await self.get("getAddressInformation", {"address": address})
+        return await self.get(
+            "getAddressInformation", {"address": address}, FullAccountState
         )
 
     async def get_extended_address_info(self, address: str) -> FullAccountState:
@@ -272,8 +437,8 @@ class Client:
         This method is based on tonlib's function getAccountState.
         For detecting wallets we recommend to use getWalletInformation.
         """
-        return FullAccountState.from_dict(
-            await self.get("getExtendedAddressInformation", {"address": address})
+        return await self.get(
+            "getExtendedAddressInformation", {"address": address}, FullAccountState
         )
 
     async def get_wallet_information(self, address: str) -> WalletState:
@@ -281,9 +446,7 @@ class Client:
         Retrieve wallet information.
         This method parses contract state and currently supports more wallet types than getExtendedAddressInformation: simple wallet, standart wallet, v3 wallet, v4 wallet.
         """
-        return WalletState.from_dict(
-            await self.get("getWalletInformation", {"address": address})
-        )
+        return await self.get("getWalletInformation", {"address": address}, WalletState)
 
     async def get_transactions(
         self,
@@ -302,60 +465,68 @@ class Client:
             "limit": limit,
             "archival": "true" if archival else "false",
         }
-        if lt:
+        if lt is not None:
             params["lt"] = lt
-        if hash:
+        if hash is not None:
             params["hash"] = hash
-        if to_lt:
+        if to_lt is not None:
             params["to_lt"] = to_lt
-        return [
-            Transaction.from_dict(transaction)
-            for transaction in await self.get("getTransactions", params)
-        ]
+        return await self.get("getTransactions", params, List[Transaction])
 
     async def get_address_balance(self, address: str) -> int:
         """
         Get balance (in nanotons) of a given address.
         """
-        return int(await self.get("getAddressBalance", {"address": address}))
+        return int(
+            await self.get("getAddressBalance", {"address": address}, Union[int, str])
+        )
 
     async def get_address_state(self, address: str) -> str:
         """
         Get state of a given address. State can be either unitialized, active or frozen.
         """
-        return await self.get("getAddressState", {"address": address})
+        return await self.get("getAddressState", {"address": address}, str)
 
     async def pack_address(self, address: str) -> str:
         """
         Convert an address from raw to human-readable format.
         """
-        return await self.get("packAddress", {"address": address})
+        return await self.get_cached_address("packAddress", address, str)
 
     async def unpack_address(self, address: str) -> str:
         """
         Convert an address from human-readable to raw format.
         """
-        return await self.get("unpackAddress", {"address": address})
+        return await self.get_cached_address("unpackAddress", address, str)
 
     async def detect_address(self, address: str) -> AddressMetadata:
         """
         Get all possible address forms.
-        """
-        return AddressMetadata.from_dict(
-            await self.get("detectAddress", {"address": address})
-        )
+        The result is cached and shared between callers, so AddressMetadata is frozen.
+        """
+        key = ("detectAddress", address)
+        result = self.address_cache.get(key)
+        if result is None:
+            try:
+                result = _detect_address_local(address)
+            except ValueError:
+                result = await self.get(
+                    "detectAddress", {"address": address}, AddressMetadata
+                )
+            self.address_cache.set(key, result)
+        return result
 
     async def get_masterchain_info(self) -> MasterchainState:
         """
         Get up-to-date masterchain state.
         """
-        return MasterchainState.from_dict(await self.get("getMasterchainInfo", {}))
+        return await self.get_memoized("getMasterchainInfo", MasterchainState)
 
     async def get_consensus_block(self) -> ConsensusBlock:
         """
         Get consensus block and its update timestamp.
         """
-        return ConsensusBlock.from_dict(await self.get("getConsensusBlock", {}))
+        return await self.get_memoized("getConsensusBlock", ConsensusBlock)
 
     async def lookup_block(
         self,
@@ -369,19 +540,19 @@ class Client:
         Look up block by either seqno, lt or unixtime.
         """
         params = {"workchain": workchain, "shard": shard}
-        if seqno:
+        if seqno is not None:
             params["seqno"] = seqno
-        if lt:
+        if lt is not None:
             params["lt"] = lt
-        if unixtime:
+        if unixtime is not None:
             params["unixtime"] = unixtime
-        return BlockID.from_dict(await self.get("lookupBlock", params))
+        return await self.get("lookupBlock", params, BlockID)
 
     async def get_shards(self, seqno: int) -> Shards:
         """
         Get shards information.
         """
-        return Shards.from_dict(await self.get("shards", {"seqno": seqno}))
+        return await self.get("shards", {"seqno": seqno}, Shards)
 
     async def get_block_transactions(
         self,
@@ -400,17 +571,15 @@ class Client:
             "count": count,
         }
 
-        if block_id.root_hash:
+        if block_id.root_hash is not None:
             params["root_hash"] = block_id.root_hash
-        if block_id.file_hash:
+        if block_id.file_hash is not None:
             params["file_hash"] = block_id.file_hash
-        if after_lt:
+        if after_lt is not None:
             params["after_lt"] = after_lt
-        if after_hash:
+        if after_hash is not None:
             params["after_hash"] = after_hash
-        return BlockTransactions.from_dict(
-            await self.get("getBlockTransactions", params)
-        )
+        return await self.get("getBlockTransactions", params, BlockTransactions)
 
     async def get_block_header(self, block_id: BlockID) -> BlockHeader:
         """
@@ -421,11 +590,11 @@ class Client:
             "shard": block_id.shard,
             "seqno": block_id.seqno,
         }
-        if block_id.root_hash:
+        if block_id.root_hash is not None:
             args["root_hash"] = block_id.root_hash
-        if block_id.file_hash:
+        if block_id.file_hash is not None:
             args["file_hash"] = block_id.file_hash
-        return BlockHeader.from_dict(await self.get("getBlockHeader", args))
+        return await self.get("getBlockHeader", args, BlockHeader)
     
     async def get_masterchain_block_header(self, seqno: int) -> BlockHeader:
         """
@@ -436,7 +605,7 @@ class Client:
             "shard": STANDARD_SHARD,
             "seqno": seqno,
         }
-        return BlockHeader.from_dict(await self.get("getBlockHeader", args))
+        return await self.get("getBlockHeader", args, BlockHeader)
 
     async def try_locate_transaction(
         self, source: str, destination: str, created_lt: int
@@ -444,15 +613,14 @@ class Client:
         """
         Locate outcoming transaction of destination address by incoming message.
         """
-        return Transaction.from_dict(
-            await self.get(
-                "tryLocateTx",
-                {
-                    "source": source,
-                    "destination": destination,
-                    "created_lt": created_lt,
-                },
-            )
+        return await self.get(
+            "tryLocateTx",
+            {
+                "source": source,
+                "destination": destination,
+                "created_lt": created_lt,
+            },
+            Transaction,
         )
 
     async def try_locate_source_transaction(
@@ -461,15 +629,14 @@ class Client:
         """
         Locate incoming transaction of source address by outcoming message.
         """
-        return Transaction.from_dict(
-            await self.get(
-                "tryLocateSourceTx",
-                {
-                    "source": source,
-                    "destination": destination,
-                    "created_lt": created_lt,
-                },
-            )
+        return await self.get(
+            "tryLocateSourceTx",
+            {
+                "source": source,
+                "destination": destination,
+                "created_lt": created_lt,
+            },
+            Transaction,
         )
 
     async def run_get_method(self, address: str, method: str, stack: List[Any]) -> dict:
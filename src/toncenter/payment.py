@@ -1,7 +1,72 @@
 from .client import Client, Transaction
-from typing import Coroutine, Callable
+from typing import Coroutine, Callable, Dict, List
 import asyncio
 import traceback
+import weakref
+
+
+# Shared pollers of each client, keyed by polling delay; entries go away with their client.
+_pollers: "weakref.WeakKeyDictionary[Client, Dict[float, PaymentPoller]]" = weakref.WeakKeyDictionary()
+
+
+class PaymentPoller:
+    """
+    Fetches transactions once per address for every registered PaymentReceiver.
+    """
+
+    def __init__(self, client: Client, delay: float = 1) -> None:
+        self.client = client
+        self.delay = delay
+        self.receivers: Dict[str, List['PaymentReceiver']] = {}
+        self.poller_task = None
+    
+    @classmethod
+    def get_poller(cls, client: Client, delay: float = 1) -> 'PaymentPoller':
+        pollers = _pollers.setdefault(client, {})
+        poller = pollers.get(delay)
+        if poller is None:
+            poller = pollers[delay] = cls(client, delay)
+        return poller
+    
+    def register(self, receiver: 'PaymentReceiver') -> None:
+        self.receivers.setdefault(receiver.address, []).append(receiver)
+        if self.poller_task is None:
+            self.poller_task = asyncio.create_task(self.start_poll())
+    
+    def unregister(self, receiver: 'PaymentReceiver') -> None:
+        receivers = self.receivers.get(receiver.address, [])
+        if receiver in receivers:
+            receivers.remove(receiver)
+        if not receivers:
+            self.receivers.pop(receiver.address, None)
+        if not self.receivers and self.poller_task is not None:
+            self.poller_task.cancel()
+            self.poller_task = None
+            _pollers.get(self.client, {}).pop(self.delay, None)
+    
+    async def poll_address(self, address: str, receivers: List['PaymentReceiver']) -> None:
+        limit = max(receiver.result_limit for receiver in receivers)
+        to_lt = min(receiver.last_lt for receiver in receivers)
+        transactions = await self.client.get_transactions(address, limit=limit, to_lt=to_lt or None)
+        for receiver in receivers:
+            receiver.process_transactions(transactions)
+    
+    async def poll(self) -> None:
+        results = await asyncio.gather(
+            *(self.poll_address(address, list(receivers)) for address, receivers in self.receivers.items()),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                traceback.print_exception(type(result), result, result.__traceback__)
+    
+    async def start_poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.delay)
+            try:
+                await self.poll()
+            except Exception:
+                traceback.print_exc()
 
 
 class PaymentReceiver:
@@ -15,34 +80,37 @@ class PaymentReceiver:
         self.delay = delay
         self.result_limit = result_limit
         self.handler = None
-        self.checker_task = None
+        self.poller = None
         self.last_lt = 0
     
     def set_handler(self, handler: Callable[[Transaction], Coroutine]) -> None:
         self.handler = handler
     
-    async def check_payment(self) -> None:
-        transactions = await self.client.get_transactions(self.address, limit=self.result_limit)
+    def process_transactions(self, transactions: List[Transaction]) -> None:
+        max_lt = self.last_lt
         for tx in transactions:
-            if int(tx.transaction_id.lt) <= self.last_lt:
+            lt = int(tx.transaction_id.lt)
+            if lt <= self.last_lt:
                 continue
-            if self.handler and tx.in_msg and len(tx.out_msgs) == 0 and tx.in_msg.source != "" and tx.in_msg.destination == self.address:
+            if self.handler and tx.in_msg and not tx.out_msgs and tx.in_msg.source and tx.in_msg.destination == self.address:
                 asyncio.create_task(self.handler(tx))
-        self.last_lt = max([int(tx.transaction_id.lt) for tx in transactions]) if len(transactions) > 0 else self.last_lt
+            if lt > max_lt:
+                max_lt = lt
+        self.last_lt = max_lt
     
-    async def start_check(self) -> None:
-        while True:
-            await asyncio.sleep(self.delay)
-            try:
-                await self.check_payment()
-            except:
-                traceback.print_exc()
+    async def check_payment(self) -> None:
+        """
+        Polls the address once, outside the shared poller; useful for one-shot checks.
+        """
+        transactions = await self.client.get_transactions(self.address, limit=self.result_limit, to_lt=self.last_lt or None)
+        self.process_transactions(transactions)
     
     async def start(self) -> None:
-        self.checker_task = asyncio.create_task(self.start_check())
+        self.poller = PaymentPoller.get_poller(self.client, self.delay)
+        self.poller.register(self)
     
     async def stop(self) -> None:
-        self.checker_task.cancel()
+        self.poller.unregister(self)
     
     async def __aenter__(self) -> 'PaymentReceiver':
         await self.start()
@@ -1,9 +1,12 @@
-from typing import Tuple, Optional, List, Callable, Coroutine, Hashable, Any
-from .client import BlockID, Client, BlockHeader, STANDARD_SHARD
+from typing import Tuple, Optional, List, Dict, Callable, Coroutine, Hashable, Any
+from .client import BlockID, Client, BlockHeader, Shards, STANDARD_SHARD
 import asyncio
+import heapq
+import itertools
 import time
 from abc import ABC, abstractmethod
 import aiosqlite
+import msgspec
 import traceback
 
 
@@ -14,14 +17,20 @@ class TemporaryMap:
 
     def __init__(self):
         self._map = {}
+        # (expiry, insertion counter, key); the counter keeps keys from ever being compared.
+        self._expiry_heap: List[Tuple[int, int, Hashable]] = []
+        self._counter = itertools.count()
 
     def set_item(self, key: Hashable, value: Any, expire_in: int = -1) -> None:
-        self._map[key] = (value, int(time.time()) + expire_in if expire_in > 0 else -1)
+        expiry = time.monotonic_ns() + expire_in * 1_000_000_000 if expire_in > 0 else -1
+        self._map[key] = (value, expiry)
+        if expiry > 0:
+            heapq.heappush(self._expiry_heap, (expiry, next(self._counter), key))
 
     def __getitem__(self, key: Hashable) -> Any:
         if key in self._map:
             value, expire_in = self._map[key]
-            if expire_in > 0 and expire_in < int(time.time()):
+            if expire_in > 0 and expire_in < time.monotonic_ns():
                 del self._map[key]
                 return None
             return value
@@ -30,9 +39,11 @@ class TemporaryMap:
     async def cleaner(self) -> None:
         while True:
             await asyncio.sleep(self.delay)
-            for key in self._map.keys():
-                _, expire_in = self._map[key]
-                if expire_in > 0 and expire_in < int(time.time()):
+            now = time.monotonic_ns()
+            while self._expiry_heap and self._expiry_heap[0][0] < now:
+                expiry, _, key = heapq.heappop(self._expiry_heap)
+                # Skip heap entries left behind by an overwrite or an earlier removal.
+                if key in self._map and self._map[key][1] == expiry:
                     del self._map[key]
 
     async def start(self, delay: int = 10) -> None:
@@ -56,6 +67,13 @@ class TxStorage(ABC):
     async def add_tx(self, address: str, amount: int, message: Optional[str] = "", expire_in: Optional[int] = -1) -> None:
         pass
 
+    async def add_txs(self, txs: List[Tuple[str, int, Optional[str], Optional[int]]]) -> None:
+        """
+        Adds many (address, amount, message, expire_in) rows at once.
+        """
+        for tx in txs:
+            await self.add_tx(*tx)
+
     @abstractmethod
     async def get_last_seqno(self) -> int:
         pass
@@ -66,38 +84,76 @@ class TxStorage(ABC):
 
 
 class SqliteStorage(TxStorage):
+    """
+    Values in the key-value table are stored as MessagePack blobs.
+    """
+
+    _CREATE_TRANSACTIONS_SQL = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            address TEXT NOT NULL,
+            amount INTEGER, 
+            message TEXT, 
+            expire_in INTEGER
+        )
+    """
+    _INSERT_TX_SQL = "INSERT INTO transactions (address, amount, message, expire_in) VALUES (?, ?, ?, ?)"
+    _SELECT_TXS_SQL = "SELECT amount, message FROM transactions WHERE address = ?"
+    _CLEANUP_SQL = "DELETE FROM transactions WHERE expire_in != -1 AND expire_in < ?"
 
     def __init__(self, db_file: str = "ton.db") -> None:
         super().__init__()
         self.db_file = db_file
         self.started = False
         self.db = None
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoders: Dict[Any, msgspec.msgpack.Decoder] = {}
     
     async def start(self, delay: int = 60) -> None:
         if self.started:
             return
         self.db = await aiosqlite.connect(self.db_file)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.execute("PRAGMA temp_store=MEMORY")
+        await self.migrate_transactions()
+        await self.db.execute(self._CREATE_TRANSACTIONS_SQL.format(table="transactions"))
         await self.db.execute("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                address TEXT NOT NULL PRIMARY KEY,
-                amount INTEGER, 
-                message TEXT, 
-                expire_in INTEGER
-            )
+            CREATE INDEX IF NOT EXISTS ix_tx_address ON transactions (address)
         """)
+        await self.db.execute("DROP INDEX IF EXISTS expire_in_index")
         await self.db.execute("""
-            CREATE INDEX IF NOT EXISTS expire_in_index ON transactions (expire_in)
+            CREATE INDEX IF NOT EXISTS expire_in_partial_index ON transactions (expire_in)
+            WHERE expire_in != -1
         """)
         await self.db.execute("""
             CREATE TABLE IF NOT EXISTS storage (
                 key TEXT NOT NULL PRIMARY KEY,
-                value TEXT
+                value BLOB
             )
         """)
         await self.db.commit()
         asyncio.create_task(self.start_cleanup(delay))
         self.started = True
     
+    async def migrate_transactions(self) -> None:
+        """
+        Moves rows from the old layout, where address was the primary key, to the current one.
+        """
+        async with self.db.execute("PRAGMA table_info(transactions)") as cursor:
+            columns = [row[1] for row in await cursor.fetchall()]
+        if not columns or "id" in columns:
+            return
+        await self.db.executescript(f"""
+            BEGIN;
+            {self._CREATE_TRANSACTIONS_SQL.format(table="transactions_new")};
+            INSERT INTO transactions_new (address, amount, message, expire_in)
+                SELECT address, amount, message, expire_in FROM transactions;
+            DROP TABLE transactions;
+            ALTER TABLE transactions_new RENAME TO transactions;
+            COMMIT;
+        """)
+
     async def stop(self) -> None:
         await self.db.close()
 
@@ -109,22 +165,19 @@ class SqliteStorage(TxStorage):
         await self.stop()
 
     async def add_tx(self, address: str, amount: int, message: Optional[str] = "", expire_in: Optional[int] = -1) -> None:
-        await self.db.execute("""
-            INSERT INTO transactions (address, amount, message, expire_in)
-            VALUES (?, ?, ?, ?)
-        """, (address, amount, message, expire_in))
+        await self.db.execute(self._INSERT_TX_SQL, (address, amount, message, expire_in))
+        await self.db.commit()
+
+    async def add_txs(self, txs: List[Tuple[str, int, Optional[str], Optional[int]]]) -> None:
+        await self.db.executemany(self._INSERT_TX_SQL, txs)
         await self.db.commit()
     
     async def get_txs(self, address: str) -> List[Tuple[int, str]]:
-        await self.db.execute("""
-            SELECT amount, message FROM transactions WHERE address = ?
-        """, (address,))
-        return [(amount, message) for amount, message in await self.db.fetchall()]
+        async with self.db.execute(self._SELECT_TXS_SQL, (address,)) as cursor:
+            return await cursor.fetchall()
     
     async def cleanup(self) -> None:
-        await self.db.execute("""
-            DELETE FROM transactions WHERE expire_in != -1 AND expire_in < ?
-        """, (int(time.time()),))
+        await self.db.execute(self._CLEANUP_SQL, (int(time.time()),))
         await self.db.commit()
     
     async def start_cleanup(self, delay: int) -> None:
@@ -132,25 +185,31 @@ class SqliteStorage(TxStorage):
             await asyncio.sleep(delay)
             await self.cleanup()
         
-    async def set(self, key: str, value: str) -> None:
+    async def set(self, key: str, value: Any) -> None:
         await self.db.execute("""
             INSERT OR REPLACE INTO storage (key, value) VALUES (?, ?)
-        """, (key, value))
+        """, (key, self._encoder.encode(value)))
         await self.db.commit()
     
-    async def get(self, key: str) -> str:
+    async def get(self, key: str, model: Any = Any) -> Any:
         async with self.db.execute("SELECT value FROM storage WHERE key = ?", (key,)) as cursor:
             result = await cursor.fetchone()
-            if result:
+            if result is None:
+                return None
+            if isinstance(result[0], str):
+                # Written as TEXT before values were stored as MessagePack.
                 return result[0]
-            return ""
+            decoder = self._decoders.get(model)
+            if decoder is None:
+                decoder = self._decoders[model] = msgspec.msgpack.Decoder(model)
+            return decoder.decode(result[0])
         
     async def set_last_seqno(self, seqno: int) -> None:
-        await self.set("last_seqno", str(seqno))
+        await self.set("last_seqno", seqno)
     
     async def get_last_seqno(self) -> int:
-        seqno = await self.get("last_seqno")
-        if seqno != "":
+        seqno = await self.get("last_seqno", int)
+        if seqno is not None and seqno != "":
             return int(seqno)
         return 0
 
@@ -160,10 +219,20 @@ class BlockHandler:
     Calls any number of used defined handlers for each block.
     """
 
-    def __init__(self, client: Client, last_seqno: int = -1, delay: float = 1, on_checked_seqno: Callable = None) -> None:
+    def __init__(self, client: Client, last_seqno: int = -1, delay: float = 1, on_checked_seqno: Callable = None, max_concurrency: int = 32, workers: int = 8, queue_size: int = 256) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
         self.handlers: List[Callable[[BlockID], Coroutine]] = []
         self.client = client
         self.delay = delay
+        self.max_concurrency = max_concurrency
+        self.fetched_shards: Dict[int, Shards] = {}
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue: asyncio.Queue = None
+        self.worker_tasks: List[asyncio.Task] = []
         if last_seqno >= 0:
             self.last_checked_seqno = last_seqno
         else:
@@ -181,30 +250,81 @@ class BlockHandler:
                 print(f"Error in handler: {e}")
                 traceback.print_exc()
     
+    async def worker(self) -> None:
+        while True:
+            block_id = await self.queue.get()
+            try:
+                await self.call_handlers(block_id)
+            finally:
+                self.queue.task_done()
+
+    async def fetch_shards(self, seqnos: range) -> None:
+        missing = [seqno for seqno in seqnos if seqno not in self.fetched_shards]
+        results = await asyncio.gather(*(self.client.get_shards(seqno) for seqno in missing), return_exceptions=True)
+        for seqno, shards in zip(missing, results):
+            if isinstance(shards, BaseException):
+                print(f"Error while fetching shards of seqno {seqno}: {shards}")
+                traceback.print_exception(type(shards), shards, shards.__traceback__)
+            else:
+                self.fetched_shards[seqno] = shards
+
     async def block_checker(self) -> None:
         while True:
             await asyncio.sleep(self.delay)
             try:
                 last_seqno = (await self.client.get_masterchain_info()).last.seqno
-                for seqno in range(self.last_checked_seqno + 1, last_seqno + 1):
-                    asyncio.create_task(self.call_handlers(BlockID(workchain=-1, shard=STANDARD_SHARD, seqno=seqno)))
-                    shards = await self.client.get_shards(seqno)
-                    for block_id in shards.shards:
-                        asyncio.create_task(self.call_handlers(block_id))
-                    self.last_checked_seqno = seqno
-                    if self.on_checked_seqno:
-                        await self.on_checked_seqno(seqno)
-            except:
+                while self.last_checked_seqno < last_seqno:
+                    # Fetch at most max_concurrency seqnos at a time; results fetched after a
+                    # failed seqno are kept in fetched_shards for the next attempt.
+                    seqnos = range(self.last_checked_seqno + 1, min(self.last_checked_seqno + self.max_concurrency, last_seqno) + 1)
+                    await self.fetch_shards(seqnos)
+                    dispatched = []
+                    for seqno in seqnos:
+                        shards = self.fetched_shards.pop(seqno, None)
+                        if shards is None:
+                            break
+                        await self.queue.put(BlockID(workchain=-1, shard=STANDARD_SHARD, seqno=seqno))
+                        for block_id in shards.shards:
+                            await self.queue.put(block_id)
+                        dispatched.append(seqno)
+                    # A seqno only counts as checked once the handlers of all its blocks are done.
+                    await self.queue.join()
+                    for seqno in dispatched:
+                        self.last_checked_seqno = seqno
+                        if self.on_checked_seqno:
+                            await self.on_checked_seqno(seqno)
+                    if self.last_checked_seqno < seqnos[-1]:
+                        break
+            except Exception:
                 print("Caught an error while checking blocks")
                 traceback.print_exc()
 
     async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
         if self.last_checked_seqno is None:
             self.last_checked_seqno = (await self.client.get_masterchain_info()).last.seqno
+        self.worker_tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
         self.checker = asyncio.create_task(self.block_checker())
     
-    async def stop(self) -> None:
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """
+        Stops checking blocks. Blocks already queued are handled for up to drain_timeout
+        seconds; the rest are dropped, and since their seqnos were never reported as
+        checked they are handled again after a restart.
+        """
+        # stop() may run inside a worker or the checker (from a handler or on_checked_seqno).
+        current = asyncio.current_task()
         self.checker.cancel()
+        if self.checker is not current:
+            await asyncio.gather(self.checker, return_exceptions=True)
+        if drain_timeout > 0 and current not in self.worker_tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*(task for task in self.worker_tasks if task is not current), return_exceptions=True)
     
     async def __aenter__(self) -> 'BlockHandler':
         await self.start()
@@ -231,8 +351,8 @@ class Ticker:
         await self.storage.start()
         await self.block_handler.start()
     
-    async def stop(self) -> None:
-        await self.block_handler.stop()
+    async def stop(self, drain_timeout: float = 0) -> None:
+        await self.block_handler.stop(drain_timeout)
     
     async def __aenter__(self) -> 'Ticker':
         await self.start()
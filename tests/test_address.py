@@ -0,0 +1,61 @@
+import pytest
+
+from toncenter.client import (
+    BOUNCEABLE_TAG,
+    TEST_ONLY_FLAG,
+    _detect_address_local,
+    _pack_friendly,
+)
+
+RAW = "0:83dfd552e63729b472fcbcc8c45ebcc6691702558b68ec7527e1ba403a0f31a8"
+BOUNCEABLE = "EQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqB2N"
+NON_BOUNCEABLE = "UQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqEBI"
+
+
+@pytest.mark.parametrize(
+    "address, given_type",
+    [
+        (RAW, "raw_form"),
+        (RAW.upper(), "raw_form"),
+        (BOUNCEABLE, "friendly_bounceable"),
+        (NON_BOUNCEABLE, "friendly_non_bounceable"),
+    ],
+)
+def test_detect_address_forms(address, given_type):
+    metadata = _detect_address_local(address)
+    assert metadata.raw_form == RAW
+    assert metadata.bounceable.b64url == BOUNCEABLE
+    assert metadata.non_bounceable.b64url == NON_BOUNCEABLE
+    assert metadata.given_type == given_type
+    assert metadata.test_only is False
+
+
+def test_detect_address_masterchain():
+    metadata = _detect_address_local("-1:" + "33" * 32)
+    assert metadata.bounceable.b64 == "Ef8zMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzM0vF"
+    assert metadata.non_bounceable.b64 == "Uf8zMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMzMxYA"
+
+
+def test_detect_address_test_only():
+    account_id = bytes.fromhex(RAW.split(":")[1])
+    test_form = _pack_friendly(BOUNCEABLE_TAG | TEST_ONLY_FLAG, 0, account_id)
+    metadata = _detect_address_local(test_form.b64url)
+    assert metadata.test_only is True
+    assert metadata.raw_form == RAW
+    assert metadata.bounceable == test_form
+
+
+@pytest.mark.parametrize(
+    "address",
+    [
+        "0:83df d552e63729b472fcbcc8c45ebcc6691702558b68ec7527e1ba403a0f31a8",
+        "0:83dfd552",
+        " 0:83dfd552e63729b472fcbcc8c45ebcc6691702558b68ec7527e1ba403a0f31a8",
+        "999:83dfd552e63729b472fcbcc8c45ebcc6691702558b68ec7527e1ba403a0f31a8",
+        BOUNCEABLE[:-1] + "M",
+        "not an address",
+    ],
+)
+def test_detect_address_rejects_invalid(address):
+    with pytest.raises(ValueError):
+        _detect_address_local(address)
@@ -0,0 +1,70 @@
+import asyncio
+import sqlite3
+
+from toncenter.ticker import SqliteStorage
+
+
+def create_old_schema(db_file):
+    db = sqlite3.connect(db_file)
+    db.execute("""
+        CREATE TABLE transactions (
+            address TEXT NOT NULL PRIMARY KEY,
+            amount INTEGER,
+            message TEXT,
+            expire_in INTEGER
+        )
+    """)
+    db.execute("CREATE INDEX expire_in_index ON transactions (expire_in)")
+    db.executemany(
+        "INSERT INTO transactions VALUES (?, ?, ?, ?)",
+        [("a", 1, "first", -1), ("b", 2, "second", 4102444800)],
+    )
+    db.commit()
+    db.close()
+
+
+def test_migrates_old_transactions_table(tmp_path):
+    db_file = str(tmp_path / "ton.db")
+    create_old_schema(db_file)
+
+    async def run():
+        storage = SqliteStorage(db_file)
+        await storage.start()
+        try:
+            assert await storage.get_txs("a") == [(1, "first")]
+            assert await storage.get_txs("b") == [(2, "second")]
+            await storage.add_tx("a", 3, "again")
+            await storage.add_tx("a", 4, "once more")
+            assert await storage.get_txs("a") == [
+                (1, "first"),
+                (3, "again"),
+                (4, "once more"),
+            ]
+        finally:
+            await storage.stop()
+
+    asyncio.run(run())
+
+    db = sqlite3.connect(db_file)
+    columns = [row[1] for row in db.execute("PRAGMA table_info(transactions)")]
+    indexes = {
+        row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    }
+    db.close()
+    assert columns == ["id", "address", "amount", "message", "expire_in"]
+    assert "expire_in_index" not in indexes
+    assert {"ix_tx_address", "expire_in_partial_index"} <= indexes
+
+
+def test_new_database_allows_several_txs_per_address(tmp_path):
+    async def run():
+        storage = SqliteStorage(str(tmp_path / "ton.db"))
+        await storage.start()
+        try:
+            await storage.add_tx("a", 1, "first")
+            await storage.add_tx("a", 2, "second")
+            assert await storage.get_txs("a") == [(1, "first"), (2, "second")]
+        finally:
+            await storage.stop()
+
+    asyncio.run(run())